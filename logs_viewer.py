@@ -1,471 +1,125 @@
 import os
+import asyncio
 import uvicorn
-import json
+import orjson
 import datetime
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
 from typing import Dict, Any, List
 
 app = FastAPI(title="SimuVerse Logs Viewer")
 
-# Setup templates directory
+# Templates and static assets (CSS, JS, etc.) ship with the repo.
+# A single module-level Environment with a bytecode cache means logs.html is
+# compiled once and reused across requests (and across restarts, via .jinja_cache).
 templates_dir = "log_templates"
-os.makedirs(templates_dir, exist_ok=True)
-templates = Jinja2Templates(directory=templates_dir)
+os.makedirs(".jinja_cache", exist_ok=True)
+jinja_env = Environment(
+    loader=FileSystemLoader(templates_dir),
+    bytecode_cache=FileSystemBytecodeCache(".jinja_cache"),
+    auto_reload=False,
+    autoescape=select_autoescape(["html"])
+)
 
-# Create static files directory for CSS, JS, etc.
 static_dir = "static"
-os.makedirs(static_dir, exist_ok=True)
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-# Create CSS file
-with open(f"{static_dir}/style.css", "w") as f:
-    f.write("""
-body {
-    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-    margin: 0;
-    padding: 0;
-    background-color: #f8f9fa;
-    color: #333;
-}
-
-.container {
-    display: flex;
-    height: 100vh;
-}
-
-.sidebar {
-    width: 250px;
-    min-width: 250px; /* Prevent sidebar from shrinking */
-    background-color: #2c3e50;
-    color: white;
-    padding: 20px;
-    overflow-y: auto;
-    box-shadow: 2px 0 5px rgba(0,0,0,0.1);
-    display: flex;
-    flex-direction: column;
-    flex-shrink: 0; /* Prevent sidebar from shrinking */
-}
-
-.content {
-    flex-grow: 1;
-    padding: 20px;
-    overflow-y: auto;
-    position: relative;
-}
-
-.header {
-    display: flex;
-    justify-content: space-between;
-    align-items: center;
-    margin-bottom: 20px;
-    border-bottom: 1px solid #e0e0e0;
-    padding-bottom: 15px;
-}
-
-.header h1 {
-    margin: 0;
-    color: #2c3e50;
-}
-
-.agent-list {
-    margin-top: 20px;
-    flex-grow: 1;
-}
-
-.agent-btn {
-    display: block;
-    width: 100%;
-    padding: 12px;
-    margin-bottom: 10px;
-    background-color: #3498db;
-    color: white;
-    border: none;
-    border-radius: 4px;
-    cursor: pointer;
-    text-align: left;
-    transition: background-color 0.2s;
-    white-space: nowrap;
-    overflow: hidden;
-    text-overflow: ellipsis;
-}
-
-.agent-btn:hover {
-    background-color: #2980b9;
-}
-
-.agent-btn.active {
-    background-color: #e74c3c;
-    font-weight: bold;
-}
-
-.log-entry {
-    background-color: white;
-    border-radius: 8px;
-    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    padding: 15px;
-    margin-bottom: 15px;
-    transition: transform 0.2s;
-    border-left: 4px solid #3498db;
-}
-
-.log-entry:hover {
-    transform: translateY(-2px);
-    box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-}
-
-.timestamp {
-    color: #7f8c8d;
-    font-size: 0.8em;
-    margin-bottom: 5px;
-}
-
-.event-type {
-    font-weight: bold;
-    color: #3498db;
-    margin-bottom: 10px;
-    font-size: 1.1em;
-}
-
-.event-type.user_input {
-    color: #e74c3c;
-}
-
-.event-type.response {
-    color: #2ecc71;
-}
-
-.event-type.validation_failure {
-    color: #f39c12;
-}
-
-.details {
-    margin-top: 10px;
-    white-space: pre-wrap;
-    font-family: monospace;
-    background-color: #f8f9fa;
-    padding: 10px;
-    border-radius: 4px;
-    overflow-x: auto;
-}
-
-.button {
-    padding: 10px 15px;
-    background-color: #3498db;
-    color: white;
-    border: none;
-    border-radius: 4px;
-    cursor: pointer;
-    font-size: 14px;
-    transition: background-color 0.2s;
-}
-
-.button:hover {
-    background-color: #2980b9;
-}
-
-.button.refresh {
-    background-color: #2ecc71;
-}
-
-.button.refresh:hover {
-    background-color: #27ae60;
-}
-
-.button.clear {
-    background-color: #e74c3c;
-    margin-left: 10px;
-}
-
-.button.clear:hover {
-    background-color: #c0392b;
-}
-
-.no-agent-selected {
-    display: flex;
-    flex-direction: column;
-    align-items: center;
-    justify-content: center;
-    height: 70vh;
-    color: #7f8c8d;
-}
-
-.no-agent-selected i {
-    font-size: 5em;
-    margin-bottom: 20px;
-    color: #bdc3c7;
-}
-
-.loading {
-    text-align: center;
-    padding: 40px;
-    color: #7f8c8d;
-}
-
-.footer {
-    margin-top: auto;
-    font-size: 0.8em;
-    text-align: center;
-    padding-top: 20px;
-    color: #ecf0f1;
-}
-
-.toggle-view {
-    display: flex;
-    margin-bottom: 15px;
-}
-
-.toggle-button {
-    padding: 8px 15px;
-    background-color: #ecf0f1;
-    border: none;
-    cursor: pointer;
-}
-
-.toggle-button.active {
-    background-color: #3498db;
-    color: white;
-}
-
-.toggle-button:first-child {
-    border-radius: 4px 0 0 4px;
-}
-
-.toggle-button:last-child {
-    border-radius: 0 4px 4px 0;
-}
-
-.chat-view .log-entry {
-    max-width: 80%;
-    margin-bottom: 15px;
-}
-
-.chat-view .event-type.user_input,
-.chat-view .log-entry.user_input {
-    background-color: #e8f4fd;
-    border-left-color: #3498db;
-    margin-right: auto;
-}
-
-.chat-view .event-type.response,
-.chat-view .log-entry.response {
-    background-color: #eafaf1;
-    border-left-color: #2ecc71;
-    margin-left: auto;
-}
-
-.actions-bar {
-    position: -webkit-sticky;
-    position: sticky;
-    top: 0;
-    background-color: rgba(248, 249, 250, 0.9);
-    z-index: 100;
-    padding: 10px 0;
-    backdrop-filter: blur(5px);
-    border-bottom: 1px solid #e0e0e0;
-    margin-bottom: 20px;
-}
-
-@media (max-width: 768px) {
-    .container {
-        flex-direction: column;
-    }
-    
-    .sidebar {
-        width: 100%;
-        max-height: 200px;
-    }
-    
-    .chat-view .log-entry {
-        max-width: 95%;
-    }
-}
-""")
-
-# Create HTML template for the chat interface
-with open(f"{templates_dir}/logs.html", "w") as f:
-    f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>SimuVerse Logs</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link rel="stylesheet" href="/static/style.css">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-    <script>
-        // Auto-refresh every 5 seconds
-        let autoRefresh = false;
-        let refreshInterval;
-        
-        function toggleAutoRefresh() {
-            autoRefresh = !autoRefresh;
-            const btn = document.getElementById('auto-refresh-btn');
-            
-            if (autoRefresh) {
-                btn.innerHTML = '<i class="fas fa-pause"></i> Pause Auto-Refresh';
-                btn.classList.add('active');
-                refreshInterval = setInterval(() => {
-                    fetchData();
-                }, 5000);
-            } else {
-                btn.innerHTML = '<i class="fas fa-sync"></i> Enable Auto-Refresh';
-                btn.classList.remove('active');
-                clearInterval(refreshInterval);
-            }
-        }
-        
-        function fetchData() {
-            const currentUrl = window.location.href;
-            fetch(currentUrl)
-                .then(response => response.text())
-                .then(html => {
-                    const parser = new DOMParser();
-                    const doc = parser.parseFromString(html, 'text/html');
-                    
-                    // Update agent list
-                    const oldSidebar = document.querySelector('.agent-list');
-                    const newSidebar = doc.querySelector('.agent-list');
-                    if (oldSidebar && newSidebar) {
-                        oldSidebar.innerHTML = newSidebar.innerHTML;
-                    }
-                    
-                    // Update content
-                    const oldContent = document.querySelector('.log-entries');
-                    const newContent = doc.querySelector('.log-entries');
-                    if (oldContent && newContent) {
-                        oldContent.innerHTML = newContent.innerHTML;
-                    }
-                });
-        }
-        
-        function clearLogs() {
-            if (confirm('Are you sure you want to clear all logs?')) {
-                fetch('/clear_logs', {
-                    method: 'POST'
-                }).then(response => {
-                    window.location.reload();
-                });
-            }
-        }
-        
-        function toggleView(view) {
-            const logEntries = document.querySelector('.log-entries');
-            const standardBtn = document.getElementById('standard-view-btn');
-            const chatBtn = document.getElementById('chat-view-btn');
-            
-            if (view === 'chat') {
-                logEntries.classList.add('chat-view');
-                chatBtn.classList.add('active');
-                standardBtn.classList.remove('active');
-                localStorage.setItem('viewMode', 'chat');
-            } else {
-                logEntries.classList.remove('chat-view');
-                standardBtn.classList.add('active');
-                chatBtn.classList.remove('active');
-                localStorage.setItem('viewMode', 'standard');
-            }
-        }
-        
-        window.onload = function() {
-            // Set up view mode based on localStorage
-            const viewMode = localStorage.getItem('viewMode') || 'standard';
-            toggleView(viewMode);
-            
-            // Scroll to bottom for chat view
-            if (viewMode === 'chat') {
-                const logEntries = document.querySelector('.log-entries');
-                if (logEntries) {
-                    logEntries.scrollTop = logEntries.scrollHeight;
-                }
-            }
-        };
-    </script>
-</head>
-<body>
-    <div class="container">
-        <div class="sidebar">
-            <h2>SimuVerse Logs</h2>
-            <button class="button refresh" onclick="window.location.reload()">
-                <i class="fas fa-sync"></i> Refresh
-            </button>
-            <div class="agent-list">
-                <h3>Agents</h3>
-                {% for agent_id in agents %}
-                    <button class="agent-btn {% if agent_id == selected_agent %}active{% endif %}" 
-                            onclick="window.location.href='?agent={{ agent_id }}'">
-                        <i class="fas fa-user-astronaut"></i> {{ agent_id }}
-                    </button>
-                {% endfor %}
-            </div>
-            <div class="footer">
-                SimuVerse Framework v1.0
-            </div>
-        </div>
-        
-        <div class="content">
-            {% if selected_agent %}
-                <div class="header">
-                    <h1><i class="fas fa-user-astronaut"></i> Agent: {{ selected_agent }}</h1>
-                    <div>
-                        <button id="auto-refresh-btn" class="button" onclick="toggleAutoRefresh()">
-                            <i class="fas fa-sync"></i> Enable Auto-Refresh
-                        </button>
-                        <button class="button clear" onclick="clearLogs()">
-                            <i class="fas fa-trash"></i> Clear Logs
-                        </button>
-                    </div>
-                </div>
-                
-                <div class="actions-bar">
-                    <div class="toggle-view">
-                        <button id="standard-view-btn" class="toggle-button active" onclick="toggleView('standard')">
-                            <i class="fas fa-list"></i> Standard View
-                        </button>
-                        <button id="chat-view-btn" class="toggle-button" onclick="toggleView('chat')">
-                            <i class="fas fa-comments"></i> Chat View
-                        </button>
-                    </div>
-                </div>
-                
-                <div class="log-entries">
-                    {% for log in agent_logs %}
-                        <div class="log-entry {{ log.type }}">
-                            <div class="timestamp">{{ log.timestamp }}</div>
-                            <div class="event-type {{ log.type }}">{{ log.type }}</div>
-                            {% if log.type == 'user_input' %}
-                                <div><strong>User:</strong> {{ log.details.input }}</div>
-                            {% elif log.type == 'response' %}
-                                <div><strong>Assistant:</strong> {{ log.details.text }}</div>
-                                <div><strong>Action:</strong> {{ log.details.action }} {% if log.details.location %}({{ log.details.location }}){% endif %}</div>
-                            {% else %}
-                                <pre class="details">{{ log.details|string }}</pre>
-                            {% endif %}
-                        </div>
-                    {% endfor %}
-                </div>
-            {% else %}
-                <div class="no-agent-selected">
-                    <i class="fas fa-user-astronaut"></i>
-                    <h2>Select an agent from the sidebar to view logs</h2>
-                </div>
-            {% endif %}
-        </div>
-    </div>
-</body>
-</html>
-""")
-
-# Logs file path
-logs_file = "agent_logs.json"
+# StaticFiles already emits ETag/Last-Modified and answers conditional
+# requests with 304 (the files' mtimes are stable now that they ship with the
+# repo); Cache-Control lets browsers skip even the revalidation round-trip.
+@app.middleware("http")
+async def static_cache_headers(request: Request, call_next):
+    response = await call_next(request)
+    # Mounting leaves scope["path"] as the full path (/logs/static/...) and
+    # records the mount prefix in scope["root_path"]; strip it so the check
+    # works both standalone and mounted at /logs/.
+    path = request.scope["path"]
+    root_path = request.scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    if path.startswith("/static/"):
+        response.headers.setdefault("Cache-Control", "public, max-age=3600")
+    return response
+
+# Logs file path (JSONL: one event per line, written by main.py)
+logs_file = "agent_logs.jsonl"
+
+# Parsed-logs cache. Because main.py only ever appends to the JSONL file, we
+# remember the byte offset we've consumed and parse just the new tail on each
+# change; unchanged files cost a single stat. Truncation resets the cache.
+_logs_cache = {"mtime": -1, "offset": 0, "head": b"", "data": {}, "agents": []}
+
+# First bytes of the file, kept as an identity check: if they change, the
+# file was truncated and rewritten (reset or rotation) and the offset no
+# longer refers to this content.
+_HEAD_PROBE = 256
+
+# Rendered log-entries fragments keyed by (agent, view mode), each holding
+# (entry count, html) so a render at a new count replaces the stale fragment
+# instead of accumulating one per count. Rendering the entry list dominates
+# page render time; for an unchanged agent the cached HTML is reused even
+# when other agents' logs advance the file.
+_fragment_cache: Dict[Any, Any] = {}
+
+def render_log_entries(agent_logs, cache_key=None):
+    """Render the log-entries fragment, reusing cached HTML when given a key"""
+    if cache_key is not None:
+        cached = _fragment_cache.get(cache_key)
+        if cached is not None and cached[0] == len(agent_logs):
+            return cached[1]
+    html = jinja_env.get_template("log_entries.html").render(agent_logs=agent_logs)
+    if cache_key is not None:
+        _fragment_cache[cache_key] = (len(agent_logs), html)
+    return html
+
+def _reset_logs_cache():
+    _logs_cache["offset"] = 0
+    _logs_cache["head"] = b""
+    _logs_cache["data"] = {}
+    _fragment_cache.clear()
+
+def _consume_tail(size):
+    with open(logs_file, "rb") as f:
+        head = f.read(_HEAD_PROBE)
+        if size < _logs_cache["offset"] or not head.startswith(_logs_cache["head"]):
+            # The file shrank or its beginning changed: it was truncated
+            # (reset or rotation) since we last read it, so the offset no
+            # longer points into this content. Start over.
+            _reset_logs_cache()
+        f.seek(_logs_cache["offset"])
+        tail = f.read()
+    data = _logs_cache["data"]
+    # Only consume up to the last complete line, in case a write is
+    # still in flight.
+    end = tail.rfind(b"\n") + 1
+    for line in tail[:end].splitlines():
+        if not line.strip():
+            continue
+        entry = orjson.loads(line)
+        data.setdefault(entry.pop("agent_id"), []).append(entry)
+    _logs_cache["offset"] += end
+    _logs_cache["head"] = head
 
 def load_logs():
-    """Load logs from file"""
+    """Load logs, parsing only the bytes appended since the previous call"""
     if os.path.exists(logs_file):
         try:
-            with open(logs_file, "r") as f:
-                return json.load(f)
+            st = os.stat(logs_file)
+            if st.st_mtime_ns == _logs_cache["mtime"] and st.st_size == _logs_cache["offset"]:
+                return _logs_cache["data"]
+            try:
+                _consume_tail(st.st_size)
+            except Exception:
+                # A parse failure means the cursor no longer lines up with
+                # the file; reset and reparse from the start rather than
+                # staying wedged on the same bad offset.
+                _reset_logs_cache()
+                _consume_tail(st.st_size)
+            _logs_cache["mtime"] = st.st_mtime_ns
+            _logs_cache["agents"] = list(_logs_cache["data"])
+            return _logs_cache["data"]
         except Exception as e:
             print(f"Error loading logs: {e}")
     return {}
@@ -473,6 +127,7 @@ def load_logs():
 @app.get("/", response_class=HTMLResponse)
 async def view_logs(request: Request):
     logs = load_logs()
+    agent_ids = _logs_cache["agents"] if logs else []
     selected_agent = request.query_params.get("agent")
     conversation_partner = request.query_params.get("conversation_with")
     view_mode = request.query_params.get("mode")
@@ -503,17 +158,17 @@ async def view_logs(request: Request):
             conversation_logs.sort(key=lambda x: x["timestamp"])
             agent_logs = conversation_logs
             
-        return templates.TemplateResponse("logs.html", {
-            "request": request,
-            "agents": logs.keys(),
-            "selected_agent": selected_agent,
-            "conversation_partner": conversation_partner,
-            "agent_logs": agent_logs,
-            "view_mode": "combined_chat"
-        })
+        return HTMLResponse(jinja_env.get_template("logs.html").render(
+            agents=agent_ids,
+            selected_agent=selected_agent,
+            conversation_partner=conversation_partner,
+            log_entries_html=render_log_entries(agent_logs),
+            view_mode="combined_chat"
+        ))
         
     elif selected_agent and selected_agent in logs:
-        agent_logs = logs[selected_agent]
+        # Copy so the "conversations" mode below doesn't mutate the cached dict
+        agent_logs = list(logs[selected_agent])
         
         # Check if conversations should be enhanced with messages from other agents
         if view_mode == "conversations":
@@ -542,29 +197,59 @@ async def view_logs(request: Request):
                 elif log["details"]["to"] == selected_agent:
                     conversation_partners.add(log["details"]["from"])
                     
-        return templates.TemplateResponse("logs.html", {
-            "request": request,
-            "agents": logs.keys(),
-            "selected_agent": selected_agent,
-            "agent_logs": agent_logs,
-            "conversation_partners": conversation_partners,
-            "view_mode": view_mode
-        })
+        return HTMLResponse(jinja_env.get_template("logs.html").render(
+            agents=agent_ids,
+            selected_agent=selected_agent,
+            log_entries_html=render_log_entries(
+                agent_logs, cache_key=(selected_agent, view_mode)),
+            conversation_partners=conversation_partners,
+            view_mode=view_mode
+        ))
     
-    return templates.TemplateResponse("logs.html", {
-        "request": request,
-        "agents": logs.keys(),
-        "selected_agent": selected_agent,
-        "agent_logs": [],
-        "view_mode": "none"
-    })
+    return HTMLResponse(jinja_env.get_template("logs.html").render(
+        agents=agent_ids,
+        selected_agent=selected_agent,
+        log_entries_html="",
+        view_mode="none"
+    ))
+
+@app.get("/api/agents")
+async def agents_api():
+    """Agent ids present in the logs, for refreshing the sidebar"""
+    logs = load_logs()
+    return {"agents": _logs_cache["agents"] if logs else []}
+
+@app.get("/api/logs/{agent_id}")
+async def agent_logs_api(agent_id: str, since: str = ""):
+    """Log entries for one agent, optionally only those newer than `since`"""
+    logs = load_logs()
+    entries = logs.get(agent_id, [])
+    if since:
+        entries = [log for log in entries if log["timestamp"] > since]
+    return {"agent_id": agent_id, "logs": entries}
+
+@app.get("/events")
+async def log_events():
+    """Server-sent events stream that fires whenever the log file changes"""
+    async def event_stream():
+        last = -1
+        while True:
+            try:
+                mtime = os.stat(logs_file).st_mtime_ns
+            except OSError:
+                mtime = -1
+            if mtime != last:
+                last = mtime
+                yield "data: changed\n\n"
+            await asyncio.sleep(1)
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 @app.post("/clear_logs")
 async def clear_logs():
-    # Clear logs file
-    with open(logs_file, "w") as f:
-        json.dump({}, f)
+    # Truncate the JSONL log file
+    open(logs_file, "wb").close()
+    _fragment_cache.clear()
     return {"status": "success"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=3001)
\ No newline at end of file
+    uvicorn.run("logs_viewer:app", host="127.0.0.1", port=3001)
\ No newline at end of file
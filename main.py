@@ -1,12 +1,22 @@
 import os
+import asyncio
+import functools
+import gzip
+import hashlib
+import queue
+import threading
+import re
+import time
+from collections import OrderedDict
 import uvicorn
-import json
-import datetime
+import orjson
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, ORJSONResponse
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
+import httpx
 
 load_dotenv()
 
@@ -14,91 +24,207 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise EnvironmentError("Please set the OPENAI_API_KEY environment variable.")
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # In-memory session storage per agent.
 sessions: Dict[str, List[Dict[str, str]]] = {}
 
-# Simple logging system.
-logs: Dict[str, List[Dict[str, Any]]] = {}
-logs_file = "agent_logs.json"
+# Simple logging system. Events are appended to a JSONL file (one event per
+# line) so each log_event costs one small append instead of rewriting the
+# whole history. The file write itself happens on a background thread so
+# request handlers never block on disk I/O; a None item truncates the file.
+logs_file = "agent_logs.jsonl"
+_log_queue: "queue.Queue" = queue.Queue()
 
-def save_logs():
-    with open(logs_file, "w") as f:
-        json.dump(logs, f, indent=2)
+# Rotate the active log once it passes this size; closed chunks are gzipped
+# (LLM text compresses ~5-10x) and named agent_logs.<timestamp>.jsonl.gz.
+LOG_ROTATE_BYTES = 50 * 1024 * 1024
+
+def _rotate_log(log_fp):
+    archive = f"agent_logs.{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+    with open(logs_file, "rb") as src_fp, gzip.open(archive, "wb", compresslevel=3) as dst_fp:
+        while True:
+            chunk = src_fp.read(1 << 20)
+            if not chunk:
+                break
+            dst_fp.write(chunk)
+    # Truncate through the existing append-mode handle rather than reopening
+    # with "wb": an O_APPEND handle keeps writing at the real end of file even
+    # if someone else truncates it (the viewer's /clear_logs does), whereas a
+    # plain handle would write at its stale offset and NUL-pad the head.
+    log_fp.truncate(0)
+    return log_fp
+
+# Timestamp helper: events cluster within the same second, so cache the
+# strftime'd date+time prefix and only format the microseconds per call.
+# Output matches datetime.now().isoformat().
+_ts_cache = {"sec": -1, "prefix": ""}
+
+def _iso_now() -> str:
+    now = time.time()
+    sec = int(now)
+    if sec != _ts_cache["sec"]:
+        _ts_cache["sec"] = sec
+        _ts_cache["prefix"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+    return f"{_ts_cache['prefix']}.{int((now - sec) * 1_000_000):06d}"
+
+def _log_writer():
+    # One long-lived handle: no per-batch open/close metadata churn, and no
+    # fsync — a flush per batch hands the bytes to the OS, which is durable
+    # enough for simulation logs.
+    log_fp = open(logs_file, "ab")
+    while True:
+        # Block for the first item, then drain whatever else a burst of
+        # events has already queued so one write covers the whole batch.
+        items = [_log_queue.get()]
+        while True:
+            try:
+                items.append(_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        pending = []
+        for item in items:
+            if item is None:
+                # Truncation also discards anything queued before it. Truncate
+                # in place so the handle stays in append mode (see _rotate_log).
+                log_fp.truncate(0)
+                pending = []
+            else:
+                pending.append(item)
+        if pending:
+            log_fp.write(b"".join(pending))
+            log_fp.flush()
+            if log_fp.tell() >= LOG_ROTATE_BYTES:
+                log_fp = _rotate_log(log_fp)
+
+threading.Thread(target=_log_writer, daemon=True, name="log-writer").start()
 
 def log_event(agent_id: str, event_type: str, details: Dict[str, Any]):
-    if agent_id not in logs:
-        logs[agent_id] = []
-    logs[agent_id].append({
-        "timestamp": datetime.datetime.now().isoformat(),
+    _log_queue.put(orjson.dumps({
+        "agent_id": agent_id,
+        "timestamp": _iso_now(),
         "type": event_type,
         "details": details
-    })
-    save_logs()
+    }) + b"\n")
 
 # ----------------------------------------------------------------------------
 # Session creation.
 # Inject the system prompt (with task) only when the session is new.
+# Agents share a handful of prompt/task combinations, so composing the full
+# system prompt is memoized.
 # ----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=256)
+def _full_system_prompt(system_prompt: str, task: str) -> str:
+    if task.strip():
+        return system_prompt + "\nCurrent Task: " + task
+    return system_prompt
+
 def get_or_create_session(agent_id: str, system_prompt: str, task: str) -> List[Dict[str, str]]:
     if agent_id not in sessions:
-        full_prompt = system_prompt
-        if task.strip():
-            full_prompt += "\nCurrent Task: " + task
-        sessions[agent_id] = [{"role": "system", "content": full_prompt}]
+        sessions[agent_id] = [{"role": "system", "content": _full_system_prompt(system_prompt, task)}]
     return sessions[agent_id]
 
+# Token budget for the non-system part of a session: model latency and
+# billing scale with tokens, not turns, so eviction works on an estimated
+# token count. tiktoken isn't a dependency of this repo; a ~4-chars-per-token
+# estimate is close enough to keep prompt cost bounded.
+MAX_SESSION_TOKENS = 2048
+
+def _est_tokens(content: str) -> int:
+    return len(content) // 4 + 1
+
+def trim_session(conversation: List[Dict[str, str]]):
+    """Evict the oldest non-system messages once the token budget is exceeded."""
+    total = sum(_est_tokens(msg["content"]) for msg in conversation[1:])
+    while total > MAX_SESSION_TOKENS and len(conversation) > 2:
+        total -= _est_tokens(conversation.pop(1)["content"])
+
+# Final command parsing: matches the first MOVE:/NOTHING:/CONVERSE: line and
+# captures its argument, compiled once at import.
+_COMMAND_RE = re.compile(r"^\s*(move|nothing|converse):[ \t]*(.*?)[ \t]*$",
+                         re.IGNORECASE | re.MULTILINE)
+
+# Static reminder trailers, built once instead of re-joined per request.
+_CONVERSE_REMINDER = ("Remember: You are in a conversation. Share specific information you know that might help the other agent. "
+                      "Be direct and to the point. End your answer with CONVERSE: (with no extra text).")
+_DEFAULT_REMINDER = "Remember: Provide at least one sentence of reasoning and end your answer with MOVE:, NOTHING:, or CONVERSE: (with no extra text)."
+
+# Prebuilt reminder message dicts, shared across calls (appended to the
+# outgoing message list but never stored in a session or mutated).
+_CONVERSE_REMINDER_MSG = {"role": "system", "content": _CONVERSE_REMINDER}
+_DEFAULT_REMINDER_MSG = {"role": "system", "content": _DEFAULT_REMINDER}
+
 # ----------------------------------------------------------------------------
-# Build the LLM prompt from the conversation.
-# Forwarded conversation messages (marked with "[Conversation") are grouped.
+# Assemble the chat messages for the API call.
+# The session is already in OpenAI's [{"role": ..., "content": ...}] shape, so
+# it is passed through structurally instead of being flattened into one big
+# pseudo-chat string; the per-call reminder is appended but never stored.
 # ----------------------------------------------------------------------------
-def build_prompt(conversation: List[Dict[str, str]]) -> str:
-    # Identify conversation messages
-    convo_msgs = [msg["content"] for msg in conversation if msg["content"].startswith("[Conversation")]
-    normal_msgs = [f"{msg['role'].capitalize()}: {msg['content']}" for msg in conversation if not msg["content"].startswith("[Conversation")]
-    prompt_lines = []
-    
-    # Check if we're in a conversation
-    in_conversation = any(msg["content"].startswith("[CONVERSE mode with") for msg in conversation if msg["role"] == "user")
-    
-    if convo_msgs:
-        prompt_lines.append("Conversation History:")
-        prompt_lines.extend(convo_msgs)
-    
-    prompt_lines.extend(normal_msgs)
-    prompt_lines.append("Assistant:")
-    
-    if in_conversation:
-        # Modify the reminder to encourage information sharing in conversations
-        prompt_lines.append("Remember: You are in a conversation. Share specific information you know that might help the other agent. "
-                        "Be direct and to the point. End your answer with CONVERSE: (with no extra text).")
-    else:
-        prompt_lines.append("Remember: Provide at least one sentence of reasoning and end your answer with MOVE:, NOTHING:, or CONVERSE: (with no extra text).")
-    
-    return "\n".join(prompt_lines)
+def build_messages(conversation: List[Dict[str, str]], in_conversation: bool) -> List[Dict[str, str]]:
+    return conversation + [_CONVERSE_REMINDER_MSG if in_conversation else _DEFAULT_REMINDER_MSG]
 
 # ----------------------------------------------------------------------------
 # OpenAI ChatGPT Wrapper – using the gpt-4o-mini-2024-07-18 model.
+# Async so a slow completion for one agent doesn't block the others.
 # ----------------------------------------------------------------------------
 class OpenAIChatGPT:
     def __init__(self, api_key: str, model: str = "gpt-4o-mini-2024-07-18"):
-        from openai import OpenAI
-        self.client = OpenAI(api_key=api_key)
+        # Sized for a whole Unity tick's worth of agents generating at once;
+        # the default httpx pool would queue requests beyond its limit.
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            )
+        )
         self.model = model
-    def generate(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
+    async def generate(self, messages: List[Dict[str, str]]) -> str:
+        response = await self.client.chat.completions.create(
             model=self.model,
-            messages=[{"role": "system", "content": prompt}],
+            messages=messages,
             temperature=1.0
         )
         return response.choices[0].message.content
 
+# One shared client for the whole process, so every request reuses the same
+# underlying httpx connection pool instead of paying client + TLS setup.
+llm = OpenAIChatGPT(api_key=OPENAI_API_KEY)
+
+# Exact-match LLM response cache (LRU) plus single-flight dedup: identical
+# prompts — common on agents' first turns — reuse one completion instead of
+# paying another API round-trip.
+RESPONSE_CACHE_SIZE = 4096
+_response_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_inflight: Dict[bytes, "asyncio.Task"] = {}
+
+async def generate_cached(messages: List[Dict[str, str]]) -> str:
+    key = hashlib.blake2b(orjson.dumps(messages), digest_size=16).digest()
+    if key in _response_cache:
+        _response_cache.move_to_end(key)
+        return _response_cache[key]
+    task = _inflight.get(key)
+    if task is not None:
+        # Same prompt already in flight: piggyback on its result.
+        return await asyncio.shield(task)
+    task = asyncio.ensure_future(llm.generate(messages))
+    _inflight[key] = task
+    try:
+        text = await task
+    finally:
+        _inflight.pop(key, None)
+    _response_cache[key] = text
+    if len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+    return text
+
 # ----------------------------------------------------------------------------
 # Request and Response Models.
 # ----------------------------------------------------------------------------
 class GenerateRequest(BaseModel):
-    agent_id: str
+    # Pattern keeps agent-id validation in pydantic-core (Rust) and rejects
+    # malformed ids before they can become session/log keys.
+    agent_id: str = Field(pattern=r"^[A-Za-z0-9_\-]{1,64}$")
     user_input: str
     system_prompt: str   # Full instructions (only on first request)
     task: str            # Current Task for the agent
@@ -113,11 +239,15 @@ class GenerateResponse(BaseModel):
 # /generate endpoint.
 # ----------------------------------------------------------------------------
 @app.post("/generate", response_model=GenerateResponse)
-def generate_response(data: GenerateRequest):
+async def generate_response(data: GenerateRequest):
+    # Classify the incoming input once; this drives the conversation-end
+    # bookkeeping, the reminder choice, and the forwarding format below.
+    in_converse_mode = data.user_input.startswith("[CONVERSE mode with")
+    
     # Check if this is the end of a conversation (when rounds left = 0)
-    if data.user_input.startswith("[CONVERSE mode with") and "rounds left: 0]" in data.user_input:
+    if in_converse_mode and "rounds left: 0]" in data.user_input:
         # Extract the agent name from the input
-        target_agent = data.user_input.split("with ")[1].split(",")[0]
+        target_agent = data.user_input.partition("with ")[2].partition(",")[0]
         
         # Log the conversation end event
         log_event(data.agent_id, "conversation_end", {
@@ -143,44 +273,34 @@ def generate_response(data: GenerateRequest):
     conversation = get_or_create_session(data.agent_id, data.system_prompt, data.task)
     conversation.append({"role": "user", "content": data.user_input})
     
-    prompt = build_prompt(conversation)
-    log_event(data.agent_id, "prompt_built", {"prompt": prompt})
+    messages = build_messages(conversation, in_converse_mode)
+    log_event(data.agent_id, "prompt_built", {"message_count": len(messages)})
     
-    llm = OpenAIChatGPT(api_key=OPENAI_API_KEY)
-    assistant_text = llm.generate(prompt)
+    assistant_text = await generate_cached(messages)
     
-    # Validate the response: at least one reasoning line and proper final command.
-    lines = assistant_text.strip().split("\n")
-    if len(lines) < 2:
+    # Validate and parse in one pass. The protocol requires the command to be
+    # the final line, so only that line is inspected; both failure branches
+    # fall back to a NOTHING response.
+    stripped_text = assistant_text.strip()
+    action = "nothing"
+    location = ""
+    if "\n" not in stripped_text:
         assistant_text = ("Your response is invalid. You must provide at least one sentence of reasoning.\n"
                           "NOTHING: do nothing")
         log_event(data.agent_id, "validation_failure", {"reason": "Not enough lines", "response": assistant_text})
     else:
-        final_line = lines[-1].strip().lower()
-        valid_starts = ["move:", "nothing:", "converse:"]
-        if not any(final_line.startswith(x) for x in valid_starts):
+        match = _COMMAND_RE.match(stripped_text.rsplit("\n", 1)[1])
+        if match:
+            action = match.group(1).lower()
+            if action != "nothing":
+                location = match.group(2)
+        else:
             assistant_text = ("Your final line did not start with MOVE:, NOTHING:, or CONVERSE:. Invalid response.\n"
                               "NOTHING: do nothing")
             log_event(data.agent_id, "validation_failure", {"reason": "Bad final line", "response": assistant_text})
     
     conversation.append({"role": "assistant", "content": assistant_text})
-    
-    # Parse final command.
-    action = "none"
-    location = ""
-    for line in assistant_text.splitlines():
-        l = line.strip().lower()
-        if l.startswith("move:"):
-            action = "move"
-            location = line.split(":", 1)[1].strip()
-            break
-        elif l.startswith("nothing:"):
-            action = "nothing"
-            break
-        elif l.startswith("converse:"):
-            action = "converse"
-            location = line.split(":", 1)[1].strip()
-            break
+    trim_session(conversation)
     
     # If CONVERSE, forward the entire assistant response (marked as conversation) to the target agent.
     if action == "converse" and location:
@@ -193,7 +313,7 @@ def generate_response(data: GenerateRequest):
         
         # Create a more structured conversation prompt that encourages
         # sharing specific information rather than just reasoning
-        if data.user_input.startswith("[CONVERSE mode with"):
+        if in_converse_mode:
             # This is a continuation of an existing conversation
             # Format that encourages direct information exchange
             fwd_text = f"[Conversation from {data.agent_id}]: {actual_message}"
@@ -203,13 +323,14 @@ def generate_response(data: GenerateRequest):
             fwd_text = f"[Conversation from {data.agent_id}]: {actual_message}\n\nWhen responding, share any specific information you have about the situation that might be helpful."
         
         sessions[location].append({"role": "user", "content": fwd_text})
+        trim_session(sessions[location])
         
         # Log only the actual conversation content, not reasoning or commands
         log_event(data.agent_id, "conversation_message", {
             "to": location,
             "from": data.agent_id,
             "message": actual_message,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": _iso_now()
         })
     
     log_event(data.agent_id, "response", {"assistant_text": assistant_text, "action": action, "location": location})
@@ -221,17 +342,31 @@ def generate_response(data: GenerateRequest):
         location=location.lower()
     )
 
+# ----------------------------------------------------------------------------
+# Logs viewer, mounted in-process so a single server covers both the agent
+# API and the viewer UI (at /logs/). logs_viewer.py still runs standalone on
+# port 3001 for the two-terminal workflow.
+# ----------------------------------------------------------------------------
+from logs_viewer import app as logs_app
+
+app.mount("/logs", logs_app)
+
 # ----------------------------------------------------------------------------
 # /reset endpoint to clear sessions and logs.
 # ----------------------------------------------------------------------------
 @app.post("/reset")
 def reset_system():
-    global sessions, logs
+    global sessions
     sessions = {}
-    logs = {}
-    with open(logs_file, "w") as f:
-        json.dump(logs, f)
+    # Drop cached completions too, so a fresh simulation doesn't replay
+    # responses from the previous run.
+    _response_cache.clear()
+    _inflight.clear()
+    # Truncate the JSONL log file (queued so it can't race pending writes).
+    _log_queue.put(None)
     return {"status": "ok", "message": "All sessions & logs cleared."}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=3000)
+    # Import-string form keeps multi-worker/reload options available without
+    # re-importing an already-instantiated app object.
+    uvicorn.run("main:app", host="127.0.0.1", port=3000)